@@ -0,0 +1,156 @@
+"""
+Coalesce independent requests into batches.
+
+When a script sends many queries at once, it's cheaper to collect the ones
+that arrive close together and process them as a group than to handle each
+as it comes in. Interactive chat only ever sends one query at a time, so
+there every batch simply has a size of 1.
+
+Key concept - Futures:
+    submit() puts the item on a queue together with an asyncio Future and
+    waits on that Future. A background task collects queued items into a
+    batch, processes it, and sets each Future's result, which wakes up the
+    caller waiting on it.
+"""
+import asyncio
+import contextlib
+from typing import Any, Awaitable, Callable
+
+
+class AsyncBatcher:
+    """
+    Groups items submitted within a short time window into batches.
+
+    Usage:
+        async def process_batch(items: list) -> list:
+            return [item * 2 for item in items]
+
+        batcher = AsyncBatcher(process_batch)
+        result = await batcher.submit(21)  # 42
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[list], Awaitable[list]],
+        max_batch_size: int = 16,
+        max_queue_time: float = 0.02,
+    ):
+        """
+        Initialize the batcher.
+
+        Args:
+            process_batch: Async function that takes a list of items and
+                           returns a list of results in the same order. A
+                           result that is an exception is raised to the
+                           caller that submitted that item.
+            max_batch_size: Maximum number of items in one batch
+            max_queue_time: Seconds to wait for more items after the first
+                            item of a batch arrives
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_queue_time = max_queue_time
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # The background task is started on the first submit()
+        self._task: asyncio.Task | None = None
+        # Keep references to running batches so they aren't garbage collected
+        self._batches: set[asyncio.Task] = set()
+        # (item, future) pairs taken off the queue for the batch being collected
+        self._collecting: list = []
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queue an item and wait for its result.
+
+        Args:
+            item: The item to process
+
+        Returns:
+            The result for this item
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def run(self) -> None:
+        """Collect queued items into batches and process them, forever."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            # Wait for the first item, then give others a short window to join
+            # The batch is kept on self so close() can see items already
+            # taken off the queue
+            batch = self._collecting
+            batch.append(await self._queue.get())
+            deadline = loop.time() + self.max_queue_time
+
+            while len(batch) < self.max_batch_size:
+                if (timeout := deadline - loop.time()) <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            # Process the batch in the background so the next one can start
+            # collecting straight away
+            self._collecting = []
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list) -> None:
+        """
+        Process one batch and deliver each result to its caller.
+
+        Args:
+            batch: List of (item, future) pairs
+        """
+        items = [item for item, _ in batch]
+
+        try:
+            results = await self.process_batch(items)
+        except Exception as e:
+            # The whole batch failed, so every caller gets the error
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            # Skip callers that stopped waiting (e.g. were cancelled)
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self) -> None:
+        """
+        Stop the background task.
+
+        Queries that are still queued, or in a batch that is still being
+        collected, are cancelled. Batches that are already being processed
+        are allowed to finish, so their callers still get results.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            # Wait for the task to finish; cancelling it raises CancelledError
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        for _, future in self._collecting:
+            future.cancel()
+        self._collecting = []
+
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+
+        # Wait for batches already handed off to process_batch
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
@@ -4,6 +4,54 @@ Interactive chat session for the MCP client.
 This module provides a simple command-line chat interface that sends
 user queries to a handler (OpenAIQueryHandler) and displays responses.
 """
+import asyncio
+import sys
+import threading
+
+
+async def read_input(prompt: str) -> str:
+    """
+    Read a line from the user without blocking the event loop.
+
+    input() waits until the user presses Enter, which would freeze every
+    other async task. Running it in a background thread keeps the loop
+    free. The thread is a daemon so a pending read never stops the program
+    from exiting (for example after Ctrl+C).
+
+    Args:
+        prompt: Text shown before the user's input
+
+    Returns:
+        The line the user typed
+
+    Raises:
+        EOFError: If the user pressed Ctrl+D
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(line, error) -> None:
+        # The future may already be cancelled if the chat was interrupted
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(line)
+
+    def read() -> None:
+        try:
+            line, error = input(prompt), None
+        except Exception as e:
+            line, error = None, e
+        try:
+            # Hand the result back to the event loop's thread
+            loop.call_soon_threadsafe(settle, line, error)
+        except RuntimeError:
+            pass  # The event loop has already closed
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
 
 
 async def run_chat(handler) -> None:
@@ -14,21 +62,25 @@ async def run_chat(handler) -> None:
         1. Prompts the user for input
         2. Sends the input to the handler for processing
         3. Displays the response
-        4. Repeats until the user types 'quit'
+        4. Repeats until the user types 'quit' (or presses Ctrl+D)
 
     Args:
         handler: An object with a process_query(str) async method
                  (typically OpenAIQueryHandler)
     """
+    # Write responses straight to stdout and flush once per response
+    write = sys.stdout.write
+    flush = sys.stdout.flush
+
     print("\nMCP Chat Started!")
     print("Type your questions or 'quit' to exit.\n")
 
     while True:
         try:
             # Get user input
-            # The ':=' walrus operator assigns the stripped input to 'query'
-            # and the 'if not' checks if it's empty
-            if not (query := input("You: ").strip()):
+            # read_input() waits for the user without blocking other tasks
+            line = await read_input("You: ")
+            if not (query := line.strip()):
                 continue  # Skip empty input
 
             # Check for exit command
@@ -37,10 +89,19 @@ async def run_chat(handler) -> None:
 
             # Process the query and display the response
             response = await handler.process_query(query)
-            print(f"\n{response}\n")
+            write("\n")
+            write(response)
+            write("\n\n")
+            flush()
 
-        except KeyboardInterrupt:
+        except EOFError:
+            # Handle Ctrl+D the same as typing 'quit'
+            print()
+            break
+        except (KeyboardInterrupt, asyncio.CancelledError):
             # Handle Ctrl+C gracefully
+            # asyncio.run() turns Ctrl+C into a cancellation of the running
+            # task, so it can arrive as either exception
             print("\n")
             break
         except Exception as e:
@@ -12,12 +12,33 @@ Key concept - Tool Calling Flow:
     4. We execute those tools via MCP and send results back to OpenAI
     5. OpenAI generates a final response using the tool results
 """
+import asyncio
+import collections
+import contextlib
+import importlib.util
+import io
 import json
 import os
 
 from dotenv import load_dotenv
+import httpx
 from mcp import ClientSession
-from openai import OpenAI
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+)
+
+from mcp_client.batcher import AsyncBatcher
+from mcp_client.rate_limit import TokenBucket, count_tokens, estimate_tokens
+
+# orjson is a much faster JSON parser; fall back to the standard library
+# if it isn't installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # Load environment variables from .env file (contains OPENAI_API_KEY)
 load_dotenv()
@@ -25,6 +46,97 @@ load_dotenv()
 # Model configuration - gpt-4o-mini is fast and cost-effective
 MODEL = "gpt-4o-mini"
 MAX_TOKENS = 1000
+# Size of the model's context window (prompt + response)
+MAX_CONTEXT_TOKENS = 128_000
+
+# Rate limiting - keep these at or below your account's OpenAI limits
+MAX_CONCURRENT_REQUESTS = 8
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200_000
+
+# Retry failed requests (connection errors, timeouts, 408, 409, 429 and
+# 5xx errors) with exponential backoff: wait 1s, 2s, 4s, ... up to
+# MAX_BACKOFF seconds, or longer if the server asks us to via Retry-After
+MAX_RETRIES = 5
+MAX_BACKOFF = 60
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+# HTTP connection pool shared by all handlers
+MAX_KEEPALIVE_CONNECTIONS = 50
+KEEPALIVE_EXPIRY = 60
+
+# Parameter schema for tools that don't define one (shared, don't modify)
+_EMPTY_SCHEMA = {"type": "object", "properties": {}}
+
+
+# Shared OpenAI clients, one per (API key, event loop). HTTP connections
+# belong to the event loop that opened them, so each loop gets its own client.
+_clients: dict[tuple[str, asyncio.AbstractEventLoop], AsyncOpenAI] = {}
+
+
+def _get_client(api_key: str) -> AsyncOpenAI:
+    """
+    Return an OpenAI client shared by every handler on this event loop.
+
+    Reusing one client reuses its open HTTP connections, so later handlers
+    skip the connection and TLS setup. HTTP/2 (which lets concurrent
+    requests share one connection) is used when the optional 'h2' package
+    is installed. Call close_clients() before the event loop ends.
+
+    Args:
+        api_key: OpenAI API key
+
+    Returns:
+        The shared AsyncOpenAI client
+    """
+    key = (api_key, asyncio.get_running_loop())
+    if client := _clients.get(key):
+        return client
+
+    # Forget clients whose event loop has closed; they can't be reused
+    for stale in [k for k in _clients if k[1].is_closed()]:
+        del _clients[stale]
+
+    http_client = DefaultAsyncHttpxClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+    # max_retries=0 because _completion() handles retries itself
+    client = AsyncOpenAI(api_key=api_key, max_retries=0, http_client=http_client)
+    _clients[key] = client
+    return client
+
+
+async def close_clients() -> None:
+    """Close the shared OpenAI clients created on the current event loop."""
+    loop = asyncio.get_running_loop()
+    for key in [k for k in _clients if k[1] is loop]:
+        await _clients.pop(key).close()
+
+
+def _retry_delay(error: APIStatusError, attempt: int) -> float:
+    """
+    Work out how long to wait before retrying a failed request.
+
+    Args:
+        error: The error OpenAI returned
+        attempt: Number of attempts made so far, minus one
+
+    Returns:
+        Seconds to wait: the exponential backoff, or the server's
+        Retry-After value if that is longer
+    """
+    delay = min(2 ** attempt, MAX_BACKOFF)
+
+    # Retry-After is usually a number of seconds; ignore any other format
+    try:
+        retry_after = float(error.response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return delay
+    return max(retry_after, delay)
 
 
 class OpenAIQueryHandler:
@@ -36,19 +148,44 @@ class OpenAIQueryHandler:
         - Sends queries to OpenAI with tool definitions
         - Executes any tools that OpenAI requests
         - Returns the final response
+
+    With remember_history=True the handler keeps conversation state: each
+    query is sent along with the earlier queries and answers. Use one
+    handler per conversation, and call reset_history() to start over.
     """
 
-    def __init__(self, client_session: ClientSession):
+    def __init__(
+        self,
+        client_session: ClientSession,
+        max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+        rpm: int = REQUESTS_PER_MINUTE,
+        tpm: int = TOKENS_PER_MINUTE,
+        batch_mode: bool = False,
+        remember_history: bool = False,
+    ):
         """
         Initialize the handler with an MCP client session.
 
         Args:
             client_session: Active MCP ClientSession for tool execution
+            max_concurrent: Maximum number of OpenAI requests in flight
+            rpm: Maximum OpenAI requests per minute
+            tpm: Maximum OpenAI tokens per minute
+            batch_mode: Group queries that arrive close together into
+                        batches (useful for scripts sending many queries).
+                        Call close() when done.
+            remember_history: Send earlier turns of the conversation with
+                              each query (ignored in batch mode, where
+                              queries are independent)
 
         Raises:
             RuntimeError: If OPENAI_API_KEY environment variable is not set
         """
         self.client_session = client_session
+        # Tool definitions are fetched once and reused for every query
+        self._tools_cache: list | None = None
+        # Estimated prompt tokens the tool definitions add to a request
+        self._tools_tokens = 0
 
         # The ':=' is the "walrus operator" - it assigns and returns the value
         # This is equivalent to:
@@ -60,7 +197,23 @@ class OpenAIQueryHandler:
                 "Add it to your .env file."
             )
 
-        self.openai = OpenAI(api_key=api_key)
+        # AsyncOpenAI lets us 'await' API calls instead of blocking the loop
+        self.openai = _get_client(api_key)
+
+        # Limit how many requests run at once and how fast they're sent
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self._bucket = TokenBucket(rpm, tpm)
+
+        # In batch mode, queries are collected and processed in groups
+        self._batcher = AsyncBatcher(self._process_batch) if batch_mode else None
+
+        self.remember_history = remember_history
+        # Conversation history as (message, token count) pairs, so earlier
+        # turns are remembered. The oldest turns are dropped when the history
+        # no longer fits in the context window. Batch queries are independent
+        # and don't use it.
+        self._history: collections.deque[tuple[dict, int]] = collections.deque()
+        self._history_tokens = 0
 
     async def process_query(self, query: str) -> str:
         """
@@ -72,52 +225,300 @@ class OpenAIQueryHandler:
         Returns:
             The AI's response, including any tool usage information
         """
-        # Build the conversation with the user's message
-        messages = [{"role": "user", "content": query}]
+        if self._batcher:
+            return await self._batcher.submit(query)
+        return await self._process_query(query, remember=self.remember_history)
+
+    def reset_history(self) -> None:
+        """Forget the conversation so far; the next query starts fresh."""
+        self._history.clear()
+        self._history_tokens = 0
+
+    async def close(self) -> None:
+        """
+        Stop the handler's background work.
+
+        In batch mode this stops the batcher's background task, so scripts
+        using batch mode should call it when they're done sending queries.
+        """
+        if self._batcher:
+            await self._batcher.close()
+
+    async def _process_batch(self, queries: list[str]) -> list:
+        """
+        Process a batch of independent queries concurrently.
 
-        # Send to OpenAI with available tools
-        # OpenAI will decide whether to use any tools based on the query
-        initial_response = self.openai.chat.completions.create(
+        OpenAI's chat API takes one conversation per request, so the batch
+        is sent as concurrent requests (still limited by the rate limiter).
+
+        Args:
+            queries: The queries collected by the batcher
+
+        Returns:
+            One response (or exception) per query, in the same order
+        """
+        return await asyncio.gather(
+            *(self._process_query(query) for query in queries),
+            return_exceptions=True,
+        )
+
+    async def _process_query(self, query: str, remember: bool = False) -> str:
+        """
+        Send one query to OpenAI and run any tools it asks for.
+
+        Args:
+            query: The user's question or request
+            remember: Include the conversation history in the request and
+                      add this turn to it afterwards
+
+        Returns:
+            The AI's response, including any tool usage information
+        """
+        tools = await self._get_tools()  # MCP tools formatted for OpenAI
+        user_message = {"role": "user", "content": query}
+        # This turn's messages with their token counts, so each message is
+        # only counted once
+        turn = [(user_message, estimate_tokens(MODEL, [user_message]))]
+
+        # Build the conversation: earlier turns, then the user's message
+        if remember:
+            # Drop old turns so the history, the new message and the tool
+            # definitions all fit in the context window
+            self._trim_history(turn[0][1] + self._tools_tokens)
+            messages = [message for message, _ in self._history]
+            context_tokens = self._history_tokens + turn[0][1]
+        else:
+            messages = []
+            context_tokens = turn[0][1]
+        messages.append(user_message)
+
+        # Send to OpenAI with available tools, streaming the response
+        # OpenAI will decide whether to use any tools based on the query.
+        # Streaming lets us start each tool as soon as its arguments are
+        # complete, while OpenAI is still sending the rest of the response.
+        content_parts = []
+        # Tool calls being assembled, keyed by their index in the response
+        pending: dict[int, dict] = {}
+
+        async with self._completion(
+            context_tokens + self._tools_tokens,
             model=MODEL,
             max_tokens=MAX_TOKENS,
             messages=messages,
-            tools=await self._get_tools(),  # MCP tools formatted for OpenAI
-        )
+            tools=tools,
+            stream=True,
+        ) as stream:
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    delta = choice.delta
+
+                    # Collect any text content from the response
+                    if delta.content:
+                        content_parts.append(delta.content)
+
+                    # Tool call arguments arrive in small fragments
+                    for fragment in delta.tool_calls or ():
+                        if fragment.index not in pending:
+                            # A new tool call means the previous ones are complete
+                            self._start_tools(pending)
+                            pending[fragment.index] = {
+                                "id": fragment.id,
+                                "name": "",
+                                "args_buf": [],
+                                "task": None,
+                            }
+                        entry = pending[fragment.index]
+                        if fragment.id:
+                            entry["id"] = fragment.id
+                        if fragment.function and fragment.function.name:
+                            entry["name"] = fragment.function.name
+                        if fragment.function and fragment.function.arguments:
+                            entry["args_buf"].append(fragment.function.arguments)
+
+                    # OpenAI is done with this response, so every tool is complete
+                    if choice.finish_reason:
+                        self._start_tools(pending)
+
+                # Start anything still waiting in case no finish_reason arrived
+                self._start_tools(pending)
+            except BaseException:
+                # Don't leave tools running if the stream fails part way through
+                self._cancel_tools(pending)
+                raise
+
+        content = "".join(content_parts)
+
+        # Most replies don't use any tools, so return those right away
+        if not pending:
+            if remember:
+                assistant_message = {"role": "assistant", "content": content}
+                turn.append((
+                    assistant_message,
+                    estimate_tokens(MODEL, [assistant_message]),
+                ))
+                self._remember(turn)
+            return "Assistant: " + content
+
+        # The reply shown to the user, written one line at a time
+        reply = io.StringIO()
+        reply.write("Assistant: ")
+        if content:
+            reply.write(content)
+            reply.write("\n")
+
+        # Add assistant's response (with tool calls) to conversation history
+        tool_call_message = {
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [entry["tool_call"] for entry in pending.values()],
+        }
+        messages.append(tool_call_message)
+        turn.append((tool_call_message, estimate_tokens(MODEL, [tool_call_message])))
 
-        current_message = initial_response.choices[0].message
-        result_parts = []
-
-        # Collect any text content from the response
-        if current_message.content:
-            result_parts.append(current_message.content)
-
-        # Check if OpenAI wants to call any tools
-        # The ':=' walrus operator assigns tool_calls and checks if it's truthy
-        if tool_calls := current_message.tool_calls:
-            # Add assistant's response (with tool calls) to conversation history
-            messages.append({
-                "role": "assistant",
-                "content": current_message.content or "",
-                "tool_calls": tool_calls,
-            })
-
-            # Execute each tool that OpenAI requested
-            for tool_call in tool_calls:
-                tool_result = await self._execute_tool(tool_call)
-                result_parts.append(tool_result["log"])  # Show what tool was used
-                messages.append(tool_result["message"])  # Add result to conversation
-
-            # Get OpenAI's final response after seeing tool results
-            final_response = self.openai.chat.completions.create(
-                model=MODEL,
-                max_tokens=MAX_TOKENS,
-                messages=messages,
+        # Wait for all tools to finish
+        # asyncio.gather() returns the results in the same order as the
+        # tool calls, which OpenAI requires
+        try:
+            tool_results = await asyncio.gather(
+                *(entry["task"] for entry in pending.values())
             )
+        except BaseException:
+            # gather() doesn't stop the other tools if one fails, so do it here
+            self._cancel_tools(pending)
+            raise
+        for tool_result in tool_results:
+            reply.write(tool_result["log"])  # Show what tool was used
+            reply.write("\n")
+            messages.append(tool_result["message"])  # Add result to conversation
+            turn.append((
+                tool_result["message"],
+                estimate_tokens(MODEL, [tool_result["message"]]),
+            ))
+
+        # Only the messages added since the first request need counting
+        context_tokens += sum(tokens for _, tokens in turn[1:])
+
+        # Get OpenAI's final response after seeing tool results
+        final_response = await self._create_completion(
+            context_tokens,
+            model=MODEL,
+            max_tokens=MAX_TOKENS,
+            messages=messages,
+        )
+
+        if content := final_response.choices[0].message.content:
+            reply.write(content)
+            reply.write("\n")
+            final_message = {"role": "assistant", "content": content}
+            turn.append((final_message, estimate_tokens(MODEL, [final_message])))
 
-            if content := final_response.choices[0].message.content:
-                result_parts.append(content)
+        if remember:
+            self._remember(turn)
 
-        return "Assistant: " + "\n".join(result_parts)
+        return reply.getvalue().rstrip("\n")
+
+    def _remember(self, turn: list[tuple[dict, int]]) -> None:
+        """
+        Add one conversation turn to the history.
+
+        Args:
+            turn: The turn's (message, token count) pairs (user, assistant,
+                  and tool results)
+        """
+        self._history.extend(turn)
+        self._history_tokens += sum(tokens for _, tokens in turn)
+
+    def _trim_history(self, reserved: int) -> None:
+        """
+        Drop the oldest turns until the next request fits in the context window.
+
+        Args:
+            reserved: Tokens the request needs on top of the history (the new
+                      message and the tool definitions)
+        """
+        # Also leave room in the context window for the response
+        budget = MAX_CONTEXT_TOKENS - MAX_TOKENS - reserved
+
+        while self._history and self._history_tokens > budget:
+            _, tokens = self._history.popleft()
+            self._history_tokens -= tokens
+            # Keep dropping until the history starts with a user message, so
+            # tool results are never separated from the call that made them
+            while self._history and self._history[0][0]["role"] != "user":
+                _, tokens = self._history.popleft()
+                self._history_tokens -= tokens
+
+    async def _create_completion(self, prompt_tokens: int, **kwargs):
+        """
+        Call OpenAI's chat completions API and return the whole response.
+
+        Args:
+            prompt_tokens: Estimated tokens in the request's prompt
+            **kwargs: Arguments passed to chat.completions.create()
+
+        Returns:
+            The API response
+        """
+        async with self._completion(prompt_tokens, **kwargs) as response:
+            return response
+
+    @contextlib.asynccontextmanager
+    async def _completion(self, prompt_tokens: int, **kwargs):
+        """
+        Call OpenAI's chat completions API with rate limiting and retries.
+
+        The request keeps its concurrency slot until the 'async with' block
+        exits, so a streamed response counts towards max_concurrent until it
+        has been read. Streams are closed on exit.
+
+        Usage:
+            async with self._completion(tokens, stream=True, ...) as stream:
+                async for chunk in stream:
+                    ...
+
+        Args:
+            prompt_tokens: Estimated tokens in the request's prompt
+            **kwargs: Arguments passed to chat.completions.create()
+
+        Yields:
+            The API response (or stream, if stream=True was passed)
+        """
+        # Tokens used = prompt tokens + up to max_tokens of output
+        tokens = prompt_tokens + kwargs.get("max_tokens", 0)
+
+        for attempt in range(MAX_RETRIES + 1):
+            async with self._sem:
+                await self._bucket.acquire(tokens)
+                try:
+                    response = await self.openai.chat.completions.create(**kwargs)
+                except APIConnectionError:
+                    # Includes timeouts (APITimeoutError is a subclass)
+                    if attempt == MAX_RETRIES:
+                        raise
+                    delay = min(2 ** attempt, MAX_BACKOFF)
+                except APIStatusError as e:
+                    retryable = (
+                        e.status_code in RETRYABLE_STATUS_CODES
+                        or e.status_code >= 500
+                    )
+                    if not retryable or attempt == MAX_RETRIES:
+                        raise
+                    delay = _retry_delay(e, attempt)
+                else:
+                    try:
+                        yield response
+                    finally:
+                        # Release the HTTP connection whether or not the
+                        # stream was read to the end
+                        if kwargs.get("stream"):
+                            await response.close()
+                    return
+
+            # Back off outside the semaphore so other requests can proceed
+            await asyncio.sleep(delay)
 
     async def _get_tools(self) -> list:
         """
@@ -126,47 +527,110 @@ class OpenAIQueryHandler:
         OpenAI expects tools in a specific format with type, name,
         description, and JSON schema for parameters.
 
+        The server's tools don't change during a session, so the list is
+        fetched once and cached. Call invalidate_tools() to force a refetch.
+        The cached list is passed to OpenAI as-is; the SDK has no way to
+        accept pre-encoded JSON, so it serializes the list once per request.
+
         Returns:
             List of tool definitions in OpenAI's expected format
         """
+        if self._tools_cache is not None:
+            return self._tools_cache
+
         response = await self.client_session.list_tools()
 
-        return [
+        self._tools_cache = [
             {
                 "type": "function",
                 "function": {
                     "name": tool.name,
                     "description": tool.description or "No description",
                     # inputSchema defines the tool's parameters as JSON Schema
-                    "parameters": getattr(
-                        tool,
-                        "inputSchema",
-                        {"type": "object", "properties": {}},
+                    "parameters": (
+                        tool.inputSchema
+                        if getattr(tool, "inputSchema", None) is not None
+                        else _EMPTY_SCHEMA
                     ),
                 },
             }
             for tool in response.tools
         ]
+        self._tools_tokens = count_tokens(MODEL, json.dumps(self._tools_cache))
+        return self._tools_cache
+
+    async def prefetch_tools(self) -> None:
+        """Fetch and cache the tool list now, so the first query doesn't wait."""
+        await self._get_tools()
+
+    def invalidate_tools(self) -> None:
+        """Forget the cached tool list so the next query refetches it."""
+        self._tools_cache = None
+        self._tools_tokens = 0
 
-    async def _execute_tool(self, tool_call) -> dict:
+    def _start_tools(self, pending: dict[int, dict]) -> None:
+        """
+        Start executing every assembled tool call that isn't running yet.
+
+        Each tool runs as a background asyncio task, so it can make progress
+        while the rest of the OpenAI stream is still arriving.
+
+        Args:
+            pending: Tool calls being assembled from the stream, by index
+        """
+        for entry in pending.values():
+            if entry["task"] is None:
+                # Rebuild the tool call in the format OpenAI expects back
+                entry["tool_call"] = {
+                    "id": entry["id"],
+                    "type": "function",
+                    "function": {
+                        "name": entry["name"],
+                        "arguments": "".join(entry["args_buf"]),
+                    },
+                }
+                entry["task"] = asyncio.create_task(
+                    self._execute_tool(entry["tool_call"])
+                )
+
+    def _cancel_tools(self, pending: dict[int, dict]) -> None:
+        """
+        Cancel every tool call that was started and hasn't finished.
+
+        Args:
+            pending: Tool calls assembled from the stream, by index
+        """
+        for entry in pending.values():
+            if entry["task"]:
+                entry["task"].cancel()
+
+    async def _execute_tool(self, tool_call: dict) -> dict:
         """
         Execute an MCP tool and return the result.
 
         Args:
-            tool_call: OpenAI's tool call object containing function name and args
+            tool_call: Tool call dict containing the call id, function name
+                       and JSON-encoded arguments
 
         Returns:
             Dict with 'log' (human-readable) and 'message' (for OpenAI)
         """
-        tool_name = tool_call.function.name
-        # Parse the JSON arguments string into a Python dict
-        tool_args = json.loads(tool_call.function.arguments or "{}")
+        call_tool = self.client_session.call_tool
+        tool_name = tool_call["function"]["name"]
+        arguments = tool_call["function"]["arguments"]
 
         try:
+            # Parse the JSON arguments string into a Python dict
+            # (inside the try, since a cut-off response can leave it invalid)
+            tool_args = json_loads(arguments) if arguments else {}
             # Call the tool via MCP
-            result = await self.client_session.call_tool(tool_name, tool_args)
-            # Extract text content from the result
-            content = result.content[0].text if result.content else ""
+            result = await call_tool(tool_name, tool_args)
+            # Join the text of every content block (non-text blocks are skipped)
+            content = "".join(
+                block.text
+                for block in result.content or ()
+                if getattr(block, "text", None)
+            )
             log = f"[Used {tool_name}({tool_args})]"
         except Exception as e:
             content = f"Error: {e}"
@@ -176,7 +640,7 @@ class OpenAIQueryHandler:
             "log": log,  # Shown to user to indicate tool usage
             "message": {
                 "role": "tool",
-                "tool_call_id": tool_call.id,  # Links result to the tool call
+                "tool_call_id": tool_call["id"],  # Links result to the tool call
                 "content": content,
             },
         }
@@ -10,14 +10,15 @@ Key concepts used:
     - AsyncExitStack: Manages multiple async resources and their cleanup
     - stdio transport: Communication via standard input/output streams
 """
+import asyncio
 import sys
 from contextlib import AsyncExitStack
-from typing import Any, Awaitable, Callable
+from typing import Any
 
 from mcp import ClientSession, stdio_client, StdioServerParameters
 
 from mcp_client import chat
-from mcp_client.handlers import OpenAIQueryHandler
+from mcp_client.handlers import OpenAIQueryHandler, close_clients
 
 
 class MCPClient:
@@ -38,63 +39,130 @@ class MCPClient:
         """
         Initialize the MCP client.
 
+        If an event loop is already running, the server starts right away in
+        the background, so its startup overlaps whatever the caller does
+        before entering 'async with'. Always enter the client after creating
+        it; otherwise the server keeps running until the event loop closes.
+
         Args:
             server_path: Path to the MCP server Python script
         """
         self.server_path = server_path
-        # These will be set when entering the context manager
+        # How to start the server - built once and reused on every connect
+        self._server_params = StdioServerParameters(
+            command=sys.executable,  # Uses the current Python interpreter
+            args=[server_path],  # The server script to run
+            # Merged into the default environment. FastMCP already flushes
+            # every message; this is a defensive default for servers that
+            # don't flush their own output
+            env={"PYTHONUNBUFFERED": "1"},
+        )
+        # These will be set once the connection is established
         self.client_session: ClientSession | None = None
         self.exit_stack: AsyncExitStack | None = None
 
-    async def __aenter__(self) -> "MCPClient":
+        # The background task that owns the connection, and the event that
+        # tells it to shut down
+        self._connection: asyncio.Task | None = None
+        self._ready: asyncio.Future | None = None
+        self._stop: asyncio.Event | None = None
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass  # No loop yet - the server starts in __aenter__ instead
+        else:
+            self._start_connection()
+
+    def _start_connection(self) -> None:
+        """Start the background task that connects to the server."""
+        self._ready = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._connection = asyncio.create_task(self._run_connection())
+
+    async def _run_connection(self) -> None:
         """
-        Set up the MCP connection when entering 'async with' block.
+        Connect to the server and keep the connection open until stopped.
+
+        The MCP transport must be opened and closed by the same task, so this
+        task owns the connection for its whole lifetime. It signals _ready
+        once the session is initialized, then waits for _stop.
 
         This method:
             1. Starts the MCP server as a subprocess
             2. Establishes stdio communication streams
             3. Creates a ClientSession for MCP protocol messages
             4. Performs the MCP initialization handshake
-
-        Returns:
-            self: The configured MCPClient instance
         """
-        # AsyncExitStack manages cleanup of multiple async context managers.
-        # Think of it as a stack of resources that need to be closed in
-        # reverse order (last opened = first closed).
-        self.exit_stack = AsyncExitStack()
-        await self.exit_stack.__aenter__()
-
-        # Step 1: Start the MCP server subprocess
-        # stdio_client spawns the server and gives us read/write streams
-        # enter_async_context() registers it for automatic cleanup later
-        read, write = await self.exit_stack.enter_async_context(
-            stdio_client(
-                server=StdioServerParameters(
-                    command=sys.executable,  # Uses the current Python interpreter
-                    args=[self.server_path],  # The server script to run
-                    env=None,  # Inherit current environment variables
+        try:
+            # AsyncExitStack manages cleanup of multiple async context managers.
+            # Think of it as a stack of resources that need to be closed in
+            # reverse order (last opened = first closed).
+            async with AsyncExitStack() as self.exit_stack:
+                # Step 1: Start the MCP server subprocess
+                # stdio_client spawns the server and gives us read/write streams
+                # enter_async_context() registers it for automatic cleanup later
+                read, write = await self.exit_stack.enter_async_context(
+                    stdio_client(server=self._server_params)
                 )
-            )
-        )
 
-        # Step 2: Create an MCP session over those streams
-        # ClientSession handles the MCP protocol (JSON-RPC messages)
-        self.client_session = await self.exit_stack.enter_async_context(
-            ClientSession(read, write)
-        )
+                # Step 2: Create an MCP session over those streams
+                # ClientSession handles the MCP protocol (JSON-RPC messages)
+                self.client_session = await self.exit_stack.enter_async_context(
+                    ClientSession(read, write)
+                )
 
-        # Step 3: Perform the MCP handshake
-        # This exchanges capabilities between client and server
-        await self.client_session.initialize()
+                # Step 3: Perform the MCP handshake
+                # This exchanges capabilities between client and server
+                await self.client_session.initialize()
 
+                # Connected - let __aenter__ continue, then wait for __aexit__
+                if not self._ready.done():
+                    self._ready.set_result(None)
+                await self._stop.wait()
+        except asyncio.CancelledError:
+            # Stopped by __aenter__ (or loop shutdown) before or after startup
+            if not self._ready.done():
+                self._ready.cancel()
+            raise
+        except BaseException as e:
+            # Report startup failures to __aenter__ instead of losing them
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            else:
+                raise
+
+    async def __aenter__(self) -> "MCPClient":
+        """
+        Set up the MCP connection when entering 'async with' block.
+
+        Starts the server if __init__ couldn't, then waits until the
+        connection is ready.
+
+        Returns:
+            self: The configured MCPClient instance
+        """
+        if self._connection is None:
+            self._start_connection()
+
+        try:
+            # shield() stops a cancelled __aenter__ (e.g. Ctrl+C) from also
+            # cancelling _ready, which the connection task still uses
+            await asyncio.shield(self._ready)
+        except BaseException:
+            # Startup failed or was interrupted - stop the server, since
+            # __aexit__ won't run
+            self._connection.cancel()
+            await asyncio.gather(self._connection, return_exceptions=True)
+            raise
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """
         Clean up resources when exiting 'async with' block.
 
-        The AsyncExitStack automatically closes everything in reverse order:
+        Closes the shared OpenAI clients, then tells the connection task to
+        stop. Its AsyncExitStack then closes everything in reverse order:
             1. First: Close the ClientSession
             2. Then: Terminate the server subprocess
 
@@ -103,8 +171,13 @@ class MCPClient:
             exc_val: Exception value if an error occurred, else None
             exc_tb: Exception traceback if an error occurred, else None
         """
-        if self.exit_stack:
-            await self.exit_stack.__aexit__(exc_type, exc_val, exc_tb)
+        try:
+            # Release the OpenAI HTTP connections opened on this event loop
+            await close_clients()
+        finally:
+            if self._connection:
+                self._stop.set()
+                await self._connection
 
     async def list_all_members(self) -> None:
         """
@@ -118,34 +191,43 @@ class MCPClient:
         print("MCP Server Members")
         print("=" * 50)
 
-        # Map section names to their listing methods
-        sections = {
-            "tools": self.client_session.list_tools,
-            "prompts": self.client_session.list_prompts,
-            "resources": self.client_session.list_resources,
-        }
+        # Pair each section name with its listing method
+        sections = (
+            ("tools", self.client_session.list_tools),
+            ("prompts", self.client_session.list_prompts),
+            ("resources", self.client_session.list_resources),
+        )
+        # zip(*pairs) splits the pairs into a tuple of names and one of methods
+        names, methods = zip(*sections)
+
+        # Request all sections at the same time instead of one after another
+        # return_exceptions=True returns errors as results instead of raising,
+        # so one failing section doesn't hide the others
+        results = await asyncio.gather(
+            *(list_method() for list_method in methods),
+            return_exceptions=True,
+        )
 
-        for section_name, list_method in sections.items():
-            await self._list_section(section_name, list_method)
+        # gather() keeps the original order, so results line up with names
+        for section_name, response in zip(names, results):
+            self._format_section(section_name, response)
 
         print("\n" + "=" * 50)
 
-    async def _list_section(
-        self,
-        section: str,
-        list_method: Callable[[], Awaitable[Any]],
-    ) -> None:
+    def _format_section(self, section: str, response: Any) -> None:
         """
-        Helper to list and format one section of MCP members.
+        Helper to print one section of MCP members.
 
         Args:
             section: Name of the section ('tools', 'prompts', or 'resources')
-            list_method: Async method to call to get the list
+            response: The listing method's response, or the exception it raised
         """
+        if isinstance(response, BaseException):
+            print(f"\n{section.upper()}: Error - {response}")
+            return
+
         try:
-            # Call the listing method and get items from the response
             # getattr(response, 'tools') is like response.tools
-            response = await list_method()
             items = getattr(response, section)
 
             if items:
@@ -168,7 +250,18 @@ class MCPClient:
         tool, the AI can decide to use it when appropriate.
         """
         try:
-            handler = OpenAIQueryHandler(self.client_session)
+            # Chat is one conversation, so the handler remembers earlier turns
+            handler = OpenAIQueryHandler(
+                self.client_session,
+                remember_history=True,
+            )
+            # Fetch the tool list now so the first query doesn't wait for it.
+            # If that fails, report it the way the chat loop reports errors;
+            # the first query will simply try again.
+            try:
+                await handler.prefetch_tools()
+            except Exception as e:
+                print(f"\nError: {e}\n")
             await chat.run_chat(handler)
         except RuntimeError as e:
             print(e)
@@ -0,0 +1,135 @@
+"""
+Client-side rate limiting for OpenAI requests.
+
+OpenAI limits how many requests (RPM) and tokens (TPM) an account can use
+per minute. Going over either limit returns a 429 error, which wastes a
+round trip and has to be retried. This module keeps us under those limits
+before a request is ever sent.
+
+Key concept - Token Bucket:
+    A bucket holds up to N tokens and refills at a steady rate. Every
+    request takes tokens out; if there aren't enough, it waits until the
+    bucket has refilled. This allows short bursts while keeping the
+    average rate under the limit.
+"""
+import asyncio
+import functools
+import time
+
+# tiktoken counts tokens exactly, but it's optional
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Rough average for English text when tiktoken isn't available
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """
+    Limits both requests per minute and tokens per minute.
+
+    Usage:
+        bucket = TokenBucket(rpm=500, tpm=200_000)
+        await bucket.acquire(estimated_tokens)  # Waits if over the limit
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        """
+        Initialize a full bucket.
+
+        Args:
+            rpm: Maximum requests per minute
+            tpm: Maximum tokens per minute
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        # Only one waiter refills and takes from the bucket at a time
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        """Add back the capacity earned since the last refill."""
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int) -> None:
+        """
+        Wait until there is room for one request using 'tokens' tokens.
+
+        Args:
+            tokens: Estimated number of tokens the request will use
+        """
+        # A single request larger than the whole bucket could never fit
+        tokens = min(tokens, self.tpm)
+
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+
+                # Sleep just long enough for the scarcer limit to refill
+                await asyncio.sleep(max(
+                    (1 - self._requests) * 60 / self.rpm,
+                    (tokens - self._tokens) * 60 / self.tpm,
+                ))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    """Return the tiktoken encoding for a model, or None if unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        # Unknown model, or the encoding files couldn't be downloaded
+        return None
+
+
+def count_tokens(model: str, text: str) -> int:
+    """
+    Estimate how many tokens a piece of text will use.
+
+    Args:
+        model: OpenAI model name, used to pick the right tokenizer
+        text: The text to count
+
+    Returns:
+        Estimated token count
+    """
+    if encoding := _get_encoding(model):
+        return len(encoding.encode(text))
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_tokens(model: str, messages: list) -> int:
+    """
+    Estimate how many prompt tokens a list of chat messages will use.
+
+    Args:
+        model: OpenAI model name, used to pick the right tokenizer
+        messages: Chat messages in OpenAI's format
+
+    Returns:
+        Estimated token count
+    """
+    parts = []
+    for message in messages:
+        parts.append(str(message.get("content") or ""))
+        # Tool call names and arguments count towards the prompt too
+        for tool_call in message.get("tool_calls") or ():
+            function = tool_call["function"]
+            parts.append(function["name"])
+            parts.append(function["arguments"])
+
+    return count_tokens(model, "".join(parts))
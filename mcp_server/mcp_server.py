@@ -12,6 +12,8 @@ The server communicates via stdio (standard input/output), which means
 the client starts this script as a subprocess and sends/receives
 JSON-RPC messages through stdin/stdout.
 """
+import os
+
 from mcp.server.fastmcp import FastMCP
 
 # Create an MCP server instance
@@ -49,11 +51,29 @@ async def greeting_prompt(name: str) -> str:
 # Unlike tools, resources are for reading data, not performing actions.
 # =============================================================================
 
+GREETING_PATH = "mcp_server/greeting.txt"
+
+# Cached (modification time, contents) of the greeting file, so it's only
+# read again when the file changes
+_GREETING_CACHE: tuple[float, str] | None = None
+
+
 @mcp.resource("file://./greeting.txt")
 def greeting_file() -> str:
     """Serve the contents of greeting.txt as a resource."""
-    with open("mcp_server/greeting.txt", "r", encoding="utf-8") as file:
-        return file.read()
+    global _GREETING_CACHE
+
+    # os.stat() is much cheaper than reading the file again
+    mtime = os.stat(GREETING_PATH).st_mtime
+    if _GREETING_CACHE and _GREETING_CACHE[0] == mtime:
+        return _GREETING_CACHE[1]
+
+    # Binary mode + decode skips text mode's newline translation
+    with open(GREETING_PATH, "rb") as file:
+        contents = file.read().decode("utf-8")
+
+    _GREETING_CACHE = (mtime, contents)
+    return contents
 
 
 # =============================================================================
@@ -65,4 +85,7 @@ if __name__ == "__main__":
     # Run the server using stdio transport
     # This means it reads from stdin and writes to stdout
     # The client will spawn this as a subprocess and communicate via pipes
+    # Each JSON-RPC message is flushed as soon as it's written, so replies
+    # aren't held back in a buffer. Never print() to stdout here - anything
+    # written to stdout is read by the client as protocol messages.
     mcp.run(transport="stdio")